@@ -2,13 +2,44 @@
 API Gateway - Routes requests to appropriate microservices
 """
 from flask import Flask, request, jsonify, Response
-from flask_cors import CORS
 import requests
+import redis
+import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from urllib.parse import urlencode
 
 app = Flask(__name__)
-CORS(app)
+
+# Static CORS headers, precomputed once instead of matched per request
+_CORS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Authorization,Content-Type',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+    'Access-Control-Max-Age': '86400'
+}
+
+
+@app.before_request
+def cors_preflight():
+    """Answer CORS preflight requests immediately"""
+    if request.method == 'OPTIONS':
+        return '', 204, _CORS
+
+
+@app.after_request
+def add_cors_headers(response):
+    """Attach CORS headers to every response"""
+    response.headers.update(_CORS)
+    return response
+
 
 # Service URLs
 AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:5001')
@@ -16,39 +47,180 @@ POLL_SERVICE_URL = os.getenv('POLL_SERVICE_URL', 'http://localhost:5002')
 VOTE_SERVICE_URL = os.getenv('VOTE_SERVICE_URL', 'http://localhost:5003')
 RESULTS_SERVICE_URL = os.getenv('RESULTS_SERVICE_URL', 'http://localhost:5004')
 
+SERVICES = [
+    ('auth', AUTH_SERVICE_URL),
+    ('poll', POLL_SERVICE_URL),
+    ('vote', VOTE_SERVICE_URL),
+    ('results', RESULTS_SERVICE_URL)
+]
+
+# Shared HTTP session so upstream connections are kept alive and reused
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=Retry(total=0))
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+SUPPORTED_METHODS = {'GET', 'POST', 'DELETE', 'PUT'}
+
+# Forwarded bodies are streamed through in chunks of this size
+STREAM_CHUNK_SIZE = 64 * 1024
+PASSTHROUGH_HEADERS = ('Content-Disposition',)
+
+# Static response bodies, serialized once at import
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+_HOME_BODY = json.dumps({
+    'service': 'Sec-Vote API Gateway',
+    'version': '1.0.0',
+    'endpoints': {
+        'auth': '/api/auth/*',
+        'polls': '/api/polls/*',
+        'vote': '/api/vote/*',
+        'results': '/api/results/*'
+    }
+}).encode()
+_HEALTH_TEMPLATES = {
+    True: b'{"status":"healthy","services":%s}',
+    False: b'{"status":"degraded","services":%s}'
+}
+
+# Worker pool for probing service health concurrently
+_HEALTH_POOL = ThreadPoolExecutor(max_workers=len(SERVICES))
+
+# Aggregated health is reused for HEALTH_CACHE_TTL seconds, and a failing
+# service is re-probed only after a jittered exponential backoff so frequent
+# load balancer checks don't pile onto a degraded upstream
+HEALTH_CACHE_TTL = 1.0
+HEALTH_BACKOFF_MAX = 60
+_health_lock = threading.Lock()
+_health_cache = (0.0, None, 200)  # (timestamp, body, status)
+_health_state = {
+    service_name: {'status': 'unreachable', 'backoff': 0, 'retry_at': 0.0}
+    for service_name, _ in SERVICES
+}
+
 # Rate limiting configuration
-from collections import defaultdict
-from datetime import datetime, timedelta
-import threading
+import math
+
+RATE_LIMIT_SHARDS = 64  # must be a power of two
+RATE_LIMIT_SWEEP_INTERVAL = 60
+
+# Token buckets keyed by (client_ip, route), sharded by key hash so that
+# concurrent requests from different clients don't contend on one lock.
+# Each entry is (tokens, last_refill, window_seconds).
+_buckets = [{} for _ in range(RATE_LIMIT_SHARDS)]
+_bucket_locks = [threading.Lock() for _ in range(RATE_LIMIT_SHARDS)]
+_last_sweep = [0.0] * RATE_LIMIT_SHARDS
+
+# Redis-backed limiter shared across gateway replicas; the in-process
+# buckets above are only used when Redis is not configured or unreachable.
+REDIS_URL = os.getenv('REDIS_URL')
+try:
+    redis_client = redis.from_url(
+        REDIS_URL,
+        socket_connect_timeout=0.5,
+        socket_timeout=0.5
+    ) if REDIS_URL else None
+except:
+    redis_client = None
+
+# Atomically refill and take one token. Uses the Redis server clock so all
+# replicas agree on elapsed time. Returns {allowed, retry_after_seconds}.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last_refill')
+local tokens = tonumber(bucket[1]) or capacity
+local last = tonumber(bucket[2]) or now
+local rate = capacity / window_ms
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate / 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last_refill', now)
+redis.call('PEXPIRE', KEYS[1], window_ms)
+return {allowed, retry_after}
+"""
+token_bucket_script = redis_client.register_script(TOKEN_BUCKET_LUA) if redis_client else None
 
-request_counts = defaultdict(list)
-rate_limit_lock = threading.Lock()
+# After a Redis error, use the in-process buckets for a while instead of
+# paying a connect timeout on every request
+REDIS_RETRY_COOLDOWN = 5
+_redis_retry_at = 0.0
+
+
+def _sweep_buckets(shard, now):
+    """Evict buckets idle for a full window (they would be full again anyway)"""
+    buckets = _buckets[shard]
+    for key in [k for k, (_, last, window) in buckets.items() if now - last >= window]:
+        del buckets[key]
+    _last_sweep[shard] = now
+
+
+def _take_token(key, max_requests, window_seconds):
+    """Consume one token from the bucket for key.
+
+    Returns 0 when the request is allowed, otherwise the number of seconds
+    until a token becomes available.
+    """
+    now = time.monotonic()
+    refill_rate = max_requests / window_seconds
+    shard = hash(key) & (RATE_LIMIT_SHARDS - 1)
+    
+    with _bucket_locks[shard]:
+        buckets = _buckets[shard]
+        tokens, last, _ = buckets.get(key, (max_requests, now, window_seconds))
+        tokens = min(max_requests, tokens + (now - last) * refill_rate)
+        
+        if tokens < 1:
+            buckets[key] = (tokens, now, window_seconds)
+            return math.ceil((1 - tokens) / refill_rate)
+        
+        buckets[key] = (tokens - 1, now, window_seconds)
+        
+        if now - _last_sweep[shard] > RATE_LIMIT_SWEEP_INTERVAL:
+            _sweep_buckets(shard, now)
+    
+    return 0
+
+
+def _take_token_redis(client_ip, route, max_requests, window_seconds):
+    """Consume one token from the shared Redis bucket, falling back to the
+    in-process limiter if Redis is unavailable"""
+    global _redis_retry_at
+    
+    if token_bucket_script and time.monotonic() >= _redis_retry_at:
+        try:
+            allowed, retry_after = token_bucket_script(
+                keys=[f"rl:{client_ip}:{route}"],
+                args=[max_requests, window_seconds * 1000]
+            )
+            return 0 if allowed else max(int(retry_after), 1)
+        except redis.RedisError as e:
+            _redis_retry_at = time.monotonic() + REDIS_RETRY_COOLDOWN
+            app.logger.warning(f"Redis rate limiter unavailable: {str(e)}")
+    
+    return _take_token((client_ip, route), max_requests, window_seconds)
 
 
 def rate_limit(max_requests=100, window_seconds=60):
-    """Simple rate limiting decorator"""
+    """Token bucket rate limiting decorator (per client IP and route)"""
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            client_ip = request.remote_addr
-            current_time = datetime.utcnow()
+            retry_after = _take_token_redis(request.remote_addr, f.__name__, max_requests, window_seconds)
             
-            with rate_limit_lock:
-                # Clean old requests
-                request_counts[client_ip] = [
-                    req_time for req_time in request_counts[client_ip]
-                    if current_time - req_time < timedelta(seconds=window_seconds)
-                ]
-                
-                # Check rate limit
-                if len(request_counts[client_ip]) >= max_requests:
-                    return jsonify({
-                        'error': 'Rate limit exceeded',
-                        'retry_after': window_seconds
-                    }), 429
-                
-                # Add current request
-                request_counts[client_ip].append(current_time)
+            if retry_after:
+                return jsonify({
+                    'error': 'Rate limit exceeded',
+                    'retry_after': retry_after
+                }), 429
             
             return f(*args, **kwargs)
         return wrapped
@@ -59,21 +231,34 @@ def forward_request(service_url, path, method='GET', json_data=None, headers=Non
     """Forward request to a microservice"""
     url = f"{service_url}{path}"
     
+    if method not in SUPPORTED_METHODS:
+        return jsonify({'error': 'Unsupported method'}), 400
+    
     try:
-        if method == 'GET':
-            response = requests.get(url, headers=headers, timeout=10)
-        elif method == 'POST':
-            response = requests.post(url, json=json_data, headers=headers, timeout=10)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers, timeout=10)
-        elif method == 'PUT':
-            response = requests.put(url, json=json_data, headers=headers, timeout=10)
-        else:
-            return jsonify({'error': 'Unsupported method'}), 400
+        response = SESSION.request(
+            method, url, json=json_data, headers=headers, timeout=(2, 10), stream=True
+        )
+        
+        def generate():
+            try:
+                yield from response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            finally:
+                response.close()
+        
+        passthrough = {
+            name: response.headers[name]
+            for name in PASSTHROUGH_HEADERS
+            if name in response.headers
+        }
+        # iter_content decodes gzip/deflate bodies, so the upstream length
+        # only holds for identity-encoded responses
+        if 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+            passthrough['Content-Length'] = response.headers['Content-Length']
         
         return Response(
-            response.content,
+            generate(),
             status=response.status_code,
+            headers=passthrough,
             content_type=response.headers.get('content-type', 'application/json')
         )
     except requests.exceptions.Timeout:
@@ -88,42 +273,61 @@ def forward_request(service_url, path, method='GET', json_data=None, headers=Non
 @app.route('/', methods=['GET'])
 def home():
     """Gateway home endpoint"""
-    return jsonify({
-        'service': 'Sec-Vote API Gateway',
-        'version': '1.0.0',
-        'endpoints': {
-            'auth': '/api/auth/*',
-            'polls': '/api/polls/*',
-            'vote': '/api/vote/*',
-            'results': '/api/results/*'
-        }
-    }), 200
+    return Response(_HOME_BODY, 200, _JSON_HEADERS)
 
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    services_health = {}
+    global _health_cache
+    
+    now = time.monotonic()
+    cached_at, cached_body, cached_status = _health_cache
+    if cached_body is not None and now - cached_at < HEALTH_CACHE_TTL:
+        return Response(cached_body, cached_status, _JSON_HEADERS)
+    
+    # Probe services that are not backing off, concurrently
+    with _health_lock:
+        due = [
+            (service_name, service_url) for service_name, service_url in SERVICES
+            if now >= _health_state[service_name]['retry_at']
+        ]
+    futures = {
+        service_name: _HEALTH_POOL.submit(SESSION.get, f"{service_url}/health", timeout=2)
+        for service_name, service_url in due
+    }
     
-    # Check each service
-    for service_name, service_url in [
-        ('auth', AUTH_SERVICE_URL),
-        ('poll', POLL_SERVICE_URL),
-        ('vote', VOTE_SERVICE_URL),
-        ('results', RESULTS_SERVICE_URL)
-    ]:
+    probed = {}
+    for service_name, future in futures.items():
         try:
-            response = requests.get(f"{service_url}/health", timeout=2)
-            services_health[service_name] = 'healthy' if response.status_code == 200 else 'unhealthy'
-        except:
-            services_health[service_name] = 'unreachable'
+            response = future.result(timeout=2.5)
+            probed[service_name] = 'healthy' if response.status_code == 200 else 'unhealthy'
+        except Exception:
+            probed[service_name] = 'unreachable'
+    
+    with _health_lock:
+        for service_name, status in probed.items():
+            state = _health_state[service_name]
+            state['status'] = status
+            if status == 'healthy':
+                state['backoff'] = 0
+                state['retry_at'] = 0.0
+            else:
+                state['backoff'] = min(HEALTH_BACKOFF_MAX, max(1, state['backoff'] * 2))
+                state['retry_at'] = now + state['backoff'] * (0.8 + 0.4 * random.random())
+        
+        services_health = {
+            service_name: _health_state[service_name]['status']
+            for service_name, _ in SERVICES
+        }
     
     overall_healthy = all(status == 'healthy' for status in services_health.values())
     
-    return jsonify({
-        'status': 'healthy' if overall_healthy else 'degraded',
-        'services': services_health
-    }), 200 if overall_healthy else 503
+    body = _HEALTH_TEMPLATES[overall_healthy] % orjson.dumps(services_health)
+    status_code = 200 if overall_healthy else 503
+    _health_cache = (now, body, status_code)
+    
+    return Response(body, status_code, _JSON_HEADERS)
 
 
 # Authentication Routes
@@ -205,8 +409,10 @@ def check_vote(poll_id):
 def user_votes():
     """Get user's voting history"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    query_params = f"?page={request.args.get('page', 1)}&per_page={request.args.get('per_page', 10)}"
-    return forward_request(VOTE_SERVICE_URL, f'/vote/user{query_params}', 'GET', headers=headers)
+    params = {'per_page': request.args.get('per_page', 10)}
+    if 'cursor' in request.args:
+        params['cursor'] = request.args['cursor']
+    return forward_request(VOTE_SERVICE_URL, f'/vote/user?{urlencode(params)}', 'GET', headers=headers)
 
 
 # Results Routes
@@ -222,7 +428,11 @@ def results(poll_id):
 def detailed_results(poll_id):
     """Get detailed poll results"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(RESULTS_SERVICE_URL, f'/results/{poll_id}/detailed', 'GET', headers=headers)
+    params = {
+        'page': request.args.get('page', 1),
+        'per_page': request.args.get('per_page', 50)
+    }
+    return forward_request(RESULTS_SERVICE_URL, f'/results/{poll_id}/detailed?{urlencode(params)}', 'GET', headers=headers)
 
 
 @app.route('/api/results/<int:poll_id>/export', methods=['GET'])
@@ -248,6 +458,6 @@ def trending():
 
 
 if __name__ == '__main__':
-    import os
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=8080, debug=debug_mode)
+    # Development server only. In production run:
+    #   gunicorn -c gunicorn_conf.py app:app
+    app.run(host='0.0.0.0', port=8080, debug=False)
@@ -0,0 +1,17 @@
+"""
+Gunicorn configuration for the API Gateway
+
+Run with: gunicorn -c gunicorn_conf.py app:app
+
+The gevent worker monkey-patches the standard library before the app is
+imported, so blocking `requests`/`redis` socket I/O yields to other
+greenlets instead of pinning the worker.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 30
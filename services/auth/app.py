@@ -6,6 +6,13 @@ from flask_cors import CORS
 import bcrypt
 import os
 import sys
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from gevent import get_hub
+    from gevent.monkey import is_module_patched
+except ImportError:
+    get_hub = None
 
 # Add parent directory to path for shared imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -22,10 +29,24 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///aut
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 
+# bcrypt work factor; lower it for tests, raise it as hardware gets faster
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
 # Initialize database
 init_db(app)
 
 
+def run_cpu_bound(func, *args):
+    """Run a CPU-heavy call on a native thread when serving under gevent.
+
+    bcrypt releases the GIL, but under gevent workers it would still block
+    every other greenlet in the process for the duration of the hash.
+    """
+    if get_hub is not None and is_module_patched('threading'):
+        return get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+
 class User(db.Model):
     """User model for authentication"""
     __tablename__ = 'users'
@@ -39,11 +60,15 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = run_cpu_bound(
+            bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+        ).decode('utf-8')
     
     def check_password(self, password):
         """Verify password"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return run_cpu_bound(
+            bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8')
+        )
 
 
 @app.route('/health', methods=['GET'])
@@ -78,11 +103,14 @@ def register():
     if not validate_password(password):
         return jsonify({'error': 'Password must be at least 8 characters with letters and numbers'}), 400
     
-    # Check if user already exists
-    if User.query.filter_by(username=username).first():
-        return jsonify({'error': 'Username already exists'}), 409
+    # Check if username or email is already taken in a single query
+    existing = db.session.query(User.username, User.email).filter(
+        db.or_(User.username == username, User.email == email)
+    ).first()
     
-    if User.query.filter_by(email=email).first():
+    if existing:
+        if existing.username == username:
+            return jsonify({'error': 'Username already exists'}), 409
         return jsonify({'error': 'Email already registered'}), 409
     
     # Create new user
@@ -105,6 +133,10 @@ def register():
             },
             'token': token
         }), 201
+    except IntegrityError:
+        # Lost a race with a concurrent registration; unique constraints win
+        db.session.rollback()
+        return jsonify({'error': 'Username or email already exists'}), 409
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Registration failed: {str(e)}")
@@ -170,6 +202,6 @@ def verify_token():
 
 
 if __name__ == '__main__':
-    import os
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    # Development server only. In production run:
+    #   gunicorn -c ../../shared/gunicorn_conf.py app:app
+    app.run(host='0.0.0.0', port=5000, debug=False)
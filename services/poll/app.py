@@ -5,7 +5,11 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import sys
+import orjson
+import redis
 from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, selectinload
 
 # Add parent directory to path for shared imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -13,6 +17,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 from shared.database import db, init_db
 from shared.auth_utils import token_required
 from shared.validators import sanitize_input
+from shared.json_utils import ORJSONResponse, ojsonify
 
 app = Flask(__name__)
 CORS(app)
@@ -22,6 +27,18 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///pol
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 
+# Redis configuration for caching poll listings
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/1')
+try:
+    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+except:
+    redis_client = None
+
+# Listing cache keys embed a version counter; bumping it invalidates every
+# cached page at once without scanning for keys
+POLLS_LIST_VERSION_KEY = 'polls:list:version'
+POLLS_LIST_CACHE_TTL = 30
+
 # Initialize database
 init_db(app)
 
@@ -54,6 +71,21 @@ class PollOption(db.Model):
     order = db.Column(db.Integer, default=0)
 
 
+def polls_list_cache_key(page, per_page):
+    """Build the cache key for a page of the poll listing"""
+    version = redis_client.get(POLLS_LIST_VERSION_KEY) or 0
+    return f"polls:list:{version}:{page}:{per_page}"
+
+
+def invalidate_polls_list():
+    """Invalidate all cached poll listing pages"""
+    if redis_client:
+        try:
+            redis_client.incr(POLLS_LIST_VERSION_KEY)
+        except redis.RedisError as e:
+            app.logger.warning(f"Failed to invalidate poll list cache: {str(e)}")
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -83,6 +115,12 @@ def create_poll():
     if len(options) > 10:
         return jsonify({'error': 'Maximum 10 options allowed'}), 400
     
+    # Sanitize all options in one pass, dropping empty ones
+    options = [text for text in (sanitize_input(option, 200) for option in options) if text]
+    
+    if len(options) < 2:
+        return jsonify({'error': 'At least 2 options are required'}), 400
+    
     # Create poll
     poll = Poll(
         title=title,
@@ -100,16 +138,18 @@ def create_poll():
         except ValueError:
             return jsonify({'error': 'Invalid date format for expires_at'}), 400
     
-    # Add options
-    for idx, option_text in enumerate(options):
-        option_text = sanitize_input(option_text, 200)
-        if option_text:
-            option = PollOption(text=option_text, order=idx)
-            poll.options.append(option)
-    
     try:
+        # Flush the poll to get its id, then insert all options in one batch
         db.session.add(poll)
+        db.session.flush()
+        
+        created_options = db.session.execute(
+            insert(PollOption).returning(PollOption.id, PollOption.text, sort_by_parameter_order=True),
+            [{'poll_id': poll.id, 'text': text, 'order': idx} for idx, text in enumerate(options)]
+        ).all()
+        
         db.session.commit()
+        invalidate_polls_list()
         
         return jsonify({
             'message': 'Poll created successfully',
@@ -123,7 +163,7 @@ def create_poll():
                 'is_active': poll.is_active,
                 'allow_multiple_votes': poll.allow_multiple_votes,
                 'is_anonymous': poll.is_anonymous,
-                'options': [{'id': opt.id, 'text': opt.text} for opt in poll.options]
+                'options': [{'id': opt.id, 'text': opt.text} for opt in created_options]
             }
         }), 201
     except Exception as e:
@@ -141,11 +181,26 @@ def get_polls():
     # Limit per_page
     per_page = min(per_page, 50)
     
-    polls = Poll.query.filter_by(is_active=True).order_by(Poll.created_at.desc()).paginate(
+    # Check cache first
+    cache_key = None
+    if redis_client:
+        try:
+            cache_key = polls_list_cache_key(page, per_page)
+            cached_polls = redis_client.get(cache_key)
+            if cached_polls:
+                return ORJSONResponse(cached_polls, status=200)
+        except redis.RedisError as e:
+            app.logger.warning(f"Poll list cache unavailable: {str(e)}")
+            cache_key = None
+    
+    # selectinload fetches options for the whole page in one extra query
+    polls = Poll.query.options(selectinload(Poll.options)).filter_by(
+        is_active=True
+    ).order_by(Poll.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return jsonify({
+    response = {
         'polls': [{
             'id': poll.id,
             'title': poll.title,
@@ -160,18 +215,27 @@ def get_polls():
         'total': polls.total,
         'page': polls.page,
         'pages': polls.pages
-    }), 200
+    }
+    
+    # Cache the page for 30 seconds
+    if cache_key:
+        try:
+            redis_client.setex(cache_key, POLLS_LIST_CACHE_TTL, orjson.dumps(response))
+        except redis.RedisError as e:
+            app.logger.warning(f"Failed to cache poll list: {str(e)}")
+    
+    return ojsonify(response, 200)
 
 
 @app.route('/polls/<int:poll_id>', methods=['GET'])
 def get_poll(poll_id):
     """Get a specific poll"""
-    poll = Poll.query.get(poll_id)
+    poll = Poll.query.options(joinedload(Poll.options)).filter_by(id=poll_id).first()
     
     if not poll:
         return jsonify({'error': 'Poll not found'}), 404
     
-    return jsonify({
+    return ojsonify({
         'id': poll.id,
         'title': poll.title,
         'description': poll.description,
@@ -182,7 +246,7 @@ def get_poll(poll_id):
         'is_anonymous': poll.is_anonymous,
         'allow_multiple_votes': poll.allow_multiple_votes,
         'options': [{'id': opt.id, 'text': opt.text} for opt in poll.options]
-    }), 200
+    }, 200)
 
 
 @app.route('/polls/<int:poll_id>', methods=['DELETE'])
@@ -200,6 +264,7 @@ def delete_poll(poll_id):
     try:
         db.session.delete(poll)
         db.session.commit()
+        invalidate_polls_list()
         return jsonify({'message': 'Poll deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -223,6 +288,7 @@ def close_poll(poll_id):
     
     try:
         db.session.commit()
+        invalidate_polls_list()
         return jsonify({'message': 'Poll closed successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -231,6 +297,6 @@ def close_poll(poll_id):
 
 
 if __name__ == '__main__':
-    import os
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    # Development server only. In production run:
+    #   gunicorn -c ../../shared/gunicorn_conf.py app:app
+    app.run(host='0.0.0.0', port=5000, debug=False)
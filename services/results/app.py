@@ -1,18 +1,23 @@
 """
 Results Service - Handles vote aggregation and results display
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 import redis
-from collections import defaultdict
+import orjson
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 # Add parent directory to path for shared imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from shared.database import db, init_db
 from shared.auth_utils import token_required
+from shared.json_utils import ORJSONResponse, ojsonify
 
 app = Flask(__name__)
 CORS(app)
@@ -25,10 +30,19 @@ app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-i
 # Redis configuration for caching
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/3')
 try:
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+    # Cached values are serialized JSON bytes returned to clients as-is
+    redis_client = redis.from_url(REDIS_URL)
 except:
     redis_client = None
 
+# Poll results are served fresh for RESULTS_FRESH_SECONDS; after that a
+# cached copy is still served (until RESULTS_CACHE_TTL) while it is
+# recomputed in the background (stale-while-revalidate)
+RESULTS_FRESH_SECONDS = 30
+RESULTS_CACHE_TTL = 60
+RESULTS_REFRESH_LOCK_SECONDS = 10
+_refresh_pool = ThreadPoolExecutor(max_workers=2)
+
 # Initialize database
 init_db(app)
 
@@ -43,8 +57,29 @@ class Vote(db.Model):
     option_id = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, nullable=True)
     username = db.Column(db.String(20), nullable=True)
-    voted_at = db.Column(db.DateTime, default=db.func.now())
+    # Set in Python so SQLite stores the same format keyset cursors bind
+    voted_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))
+    
+    __table_args__ = (
+        db.UniqueConstraint('poll_id', 'user_id', name='uq_vote_poll_user'),
+        db.Index('idx_poll_option', 'poll_id', 'option_id'),
+        db.Index('idx_voted_at', 'voted_at'),
+        db.Index(
+            'idx_user_voted_at', user_id, voted_at.desc(), id.desc(),
+            postgresql_include=['poll_id', 'option_id']
+        ),
+        # The vote and results services both declare this table; keep
+        # whichever definition is imported first into a process
+        {'keep_existing': True}
+    )
+
+
+def count_votes_by_option(poll_id):
+    """Return [(option_id, count), ...] for a poll, aggregated in the database"""
+    return db.session.query(Vote.option_id, db.func.count(Vote.id)).filter_by(
+        poll_id=poll_id
+    ).group_by(Vote.option_id).all()
 
 
 @app.route('/health', methods=['GET'])
@@ -53,38 +88,14 @@ def health():
     return jsonify({'status': 'healthy', 'service': 'results'}), 200
 
 
-@app.route('/results/<int:poll_id>', methods=['GET'])
-def get_poll_results(poll_id):
-    """Get results for a specific poll"""
-    # Check cache first
-    cache_key = f"results:{poll_id}"
-    
-    if redis_client:
-        cached_results = redis_client.get(cache_key)
-        if cached_results:
-            import json
-            return jsonify(json.loads(cached_results)), 200
-    
-    # Query votes from database
-    votes = Vote.query.filter_by(poll_id=poll_id).all()
-    
-    if not votes:
-        return jsonify({
-            'poll_id': poll_id,
-            'total_votes': 0,
-            'results': []
-        }), 200
-    
-    # Aggregate results
-    vote_counts = defaultdict(int)
-    for vote in votes:
-        vote_counts[vote.option_id] += 1
-    
-    total_votes = len(votes)
+def build_poll_results(poll_id):
+    """Aggregate vote counts and percentages for a poll"""
+    vote_counts = count_votes_by_option(poll_id)
+    total_votes = sum(count for _, count in vote_counts)
     
     # Calculate percentages
     results = []
-    for option_id, count in vote_counts.items():
+    for option_id, count in vote_counts:
         percentage = (count / total_votes * 100) if total_votes > 0 else 0
         results.append({
             'option_id': option_id,
@@ -95,18 +106,57 @@ def get_poll_results(poll_id):
     # Sort by vote count
     results.sort(key=lambda x: x['votes'], reverse=True)
     
-    response = {
+    return {
         'poll_id': poll_id,
         'total_votes': total_votes,
         'results': results
     }
+
+
+def refresh_poll_results(poll_id):
+    """Recompute and re-cache poll results (runs on the refresh pool)"""
+    try:
+        with app.app_context():
+            response = build_poll_results(poll_id)
+        redis_client.setex(f"results:{poll_id}", RESULTS_CACHE_TTL, orjson.dumps(response))
+    except Exception as e:
+        app.logger.error(f"Failed to refresh results for poll {poll_id}: {str(e)}")
+
+
+@app.route('/results/<int:poll_id>', methods=['GET'])
+def get_poll_results(poll_id):
+    """Get results for a specific poll"""
+    # Check cache first; value and remaining TTL come back in one round trip
+    cache_key = f"results:{poll_id}"
     
-    # Cache results for 30 seconds
     if redis_client:
-        import json
-        redis_client.setex(cache_key, 30, json.dumps(response))
-    
-    return jsonify(response), 200
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(cache_key)
+                pipe.pttl(cache_key)
+                cached_results, ttl_ms = pipe.execute()
+            
+            if cached_results:
+                age = RESULTS_CACHE_TTL - ttl_ms / 1000
+                if age >= RESULTS_FRESH_SECONDS and redis_client.set(
+                    f"{cache_key}:refresh", 1, nx=True, ex=RESULTS_REFRESH_LOCK_SECONDS
+                ):
+                    _refresh_pool.submit(refresh_poll_results, poll_id)
+                return ORJSONResponse(cached_results, status=200)
+        except redis.RedisError as e:
+            app.logger.warning(f"Results cache unavailable: {str(e)}")
+            cache_key = None
+    
+    response = build_poll_results(poll_id)
+    
+    # Cache results; fresh for 30 seconds, served stale for 30 more
+    if redis_client and cache_key:
+        try:
+            redis_client.setex(cache_key, RESULTS_CACHE_TTL, orjson.dumps(response))
+        except redis.RedisError as e:
+            app.logger.warning(f"Failed to cache results: {str(e)}")
+    
+    return ojsonify(response, 200)
 
 
 @app.route('/results/<int:poll_id>/detailed', methods=['GET'])
@@ -114,47 +164,53 @@ def get_poll_results(poll_id):
 def get_detailed_results(poll_id):
     """Get detailed results including voter information (for poll creator)"""
     # In production, verify if user is poll creator
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
     
-    votes = Vote.query.filter_by(poll_id=poll_id).all()
+    # Limit per_page (voters listed per option)
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 100)
     
-    if not votes:
-        return jsonify({
+    vote_counts = count_votes_by_option(poll_id)
+    
+    if not vote_counts:
+        return ojsonify({
             'poll_id': poll_id,
             'total_votes': 0,
-            'votes': []
-        }), 200
-    
-    # Aggregate by option
-    vote_counts = defaultdict(int)
-    vote_details = defaultdict(list)
-    
-    for vote in votes:
-        vote_counts[vote.option_id] += 1
-        vote_details[vote.option_id].append({
-            'username': vote.username if vote.username else 'Anonymous',
-            'voted_at': vote.voted_at.isoformat()
-        })
+            'results': [],
+            'page': page,
+            'per_page': per_page
+        }, 200)
     
-    total_votes = len(votes)
+    total_votes = sum(count for _, count in vote_counts)
     
-    # Build detailed results
+    # Build detailed results with one page of voters per option
     results = []
-    for option_id, count in vote_counts.items():
+    for option_id, count in vote_counts:
         percentage = (count / total_votes * 100) if total_votes > 0 else 0
+        voters = db.session.query(Vote.username, Vote.voted_at).filter_by(
+            poll_id=poll_id, option_id=option_id
+        ).order_by(Vote.voted_at, Vote.id).limit(per_page).offset((page - 1) * per_page).all()
+        
         results.append({
             'option_id': option_id,
             'votes': count,
             'percentage': round(percentage, 2),
-            'voters': vote_details[option_id]
+            'voters': [{
+                'username': username if username else 'Anonymous',
+                'voted_at': voted_at.isoformat()
+            } for username, voted_at in voters]
         })
     
     results.sort(key=lambda x: x['votes'], reverse=True)
     
-    return jsonify({
+    return ojsonify({
         'poll_id': poll_id,
         'total_votes': total_votes,
-        'results': results
-    }), 200
+        'results': results,
+        'page': page,
+        'per_page': per_page
+    }, 200)
 
 
 @app.route('/results/<int:poll_id>/export', methods=['GET'])
@@ -163,23 +219,32 @@ def export_results(poll_id):
     """Export poll results in CSV format"""
     # In production, verify if user is poll creator
     
-    votes = Vote.query.filter_by(poll_id=poll_id).all()
-    
-    if not votes:
+    if not db.session.query(Vote.id).filter_by(poll_id=poll_id).first():
         return jsonify({'error': 'No votes found for this poll'}), 404
     
-    # Create CSV data
-    csv_lines = ['Option ID,Username,Voted At']
-    
-    for vote in votes:
-        username = vote.username if vote.username else 'Anonymous'
-        csv_lines.append(f"{vote.option_id},{username},{vote.voted_at.isoformat()}")
-    
-    csv_content = '\n'.join(csv_lines)
+    def generate():
+        """Stream CSV rows without materializing every vote"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        writer.writerow(['Option ID', 'Username', 'Voted At'])
+        
+        votes = db.session.query(Vote.option_id, Vote.username, Vote.voted_at).filter_by(
+            poll_id=poll_id
+        ).yield_per(1000)
+        
+        for vote in votes:
+            writer.writerow([
+                vote.option_id,
+                vote.username if vote.username else 'Anonymous',
+                vote.voted_at.isoformat()
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
     
-    from flask import Response
     return Response(
-        csv_content,
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={'Content-Disposition': f'attachment;filename=poll_{poll_id}_results.csv'}
     )
@@ -188,49 +253,80 @@ def export_results(poll_id):
 @app.route('/results/stats', methods=['GET'])
 def get_overall_stats():
     """Get overall voting statistics"""
-    total_votes = Vote.query.count()
+    cache_key = "results:stats"
     
-    # Get unique polls
-    unique_polls = db.session.query(Vote.poll_id).distinct().count()
-    
-    # Get unique voters
-    unique_voters = db.session.query(Vote.user_id).filter(Vote.user_id.isnot(None)).distinct().count()
+    if redis_client:
+        try:
+            cached_stats = redis_client.get(cache_key)
+            if cached_stats:
+                return ORJSONResponse(cached_stats, status=200)
+        except redis.RedisError as e:
+            app.logger.warning(f"Stats cache unavailable: {str(e)}")
+            cache_key = None
+    
+    # Single pass over votes; COUNT(DISTINCT user_id) skips anonymous votes
+    total_votes, unique_polls, unique_voters = db.session.query(
+        db.func.count(Vote.id),
+        db.func.count(db.distinct(Vote.poll_id)),
+        db.func.count(db.distinct(Vote.user_id))
+    ).one()
     
-    return jsonify({
+    response = {
         'total_votes': total_votes,
         'total_polls': unique_polls,
         'total_voters': unique_voters
-    }), 200
+    }
+    
+    # Cache stats for 60 seconds
+    if redis_client and cache_key:
+        try:
+            redis_client.setex(cache_key, 60, orjson.dumps(response))
+        except redis.RedisError as e:
+            app.logger.warning(f"Failed to cache stats: {str(e)}")
+    
+    return ojsonify(response, 200)
 
 
 @app.route('/results/trending', methods=['GET'])
 def get_trending_polls():
     """Get trending polls based on recent vote activity"""
-    from datetime import datetime, timedelta
+    cache_key = "results:trending"
     
-    # Get polls with votes in the last 24 hours
+    if redis_client:
+        try:
+            cached_trending = redis_client.get(cache_key)
+            if cached_trending:
+                return ORJSONResponse(cached_trending, status=200)
+        except redis.RedisError as e:
+            app.logger.warning(f"Trending polls cache unavailable: {str(e)}")
+            cache_key = None
+    
+    # Top 10 polls by votes in the last 24 hours, aggregated in the database
     recent_cutoff = datetime.utcnow() - timedelta(hours=24)
     
-    # Query votes from last 24 hours
-    recent_votes = Vote.query.filter(Vote.voted_at >= recent_cutoff).all()
-    
-    # Count votes per poll
-    poll_vote_counts = defaultdict(int)
-    for vote in recent_votes:
-        poll_vote_counts[vote.poll_id] += 1
+    vote_count = db.func.count(Vote.id).label('recent_votes')
+    trending = db.session.query(Vote.poll_id, vote_count).filter(
+        Vote.voted_at >= recent_cutoff
+    ).group_by(Vote.poll_id).order_by(vote_count.desc()).limit(10).all()
     
-    # Sort by vote count
-    trending = sorted(poll_vote_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-    
-    return jsonify({
+    response = {
         'trending_polls': [
             {'poll_id': poll_id, 'recent_votes': count}
             for poll_id, count in trending
         ]
-    }), 200
+    }
+    
+    # Cache trending polls for 60 seconds
+    if redis_client and cache_key:
+        try:
+            redis_client.setex(cache_key, 60, orjson.dumps(response))
+        except redis.RedisError as e:
+            app.logger.warning(f"Failed to cache trending polls: {str(e)}")
+    
+    return ojsonify(response, 200)
 
 
 if __name__ == '__main__':
-    import os
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    # Development server only. In production run:
+    #   gunicorn -c ../../shared/gunicorn_conf.py app:app
+    app.run(host='0.0.0.0', port=5000, debug=False)
@@ -6,16 +6,32 @@ from flask_cors import CORS
 import os
 import sys
 import redis
+import base64
+import binascii
 from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from rq import Queue, Retry
+except ImportError:
+    Queue = None
 
 # Add parent directory to path for shared imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from shared.database import db, init_db
 from shared.auth_utils import token_required
+from shared.json_utils import ojsonify
 
 app = Flask(__name__)
-CORS(app)
+# CORS only for the vote routes; browsers may cache preflights for a day
+CORS(app, resources={r"/vote*": {
+    "origins": os.getenv('ALLOWED_ORIGINS', '*').split(','),
+    "max_age": 86400
+}})
 
 # Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///vote.db')
@@ -24,11 +40,57 @@ app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-i
 
 # Redis configuration for vote tracking
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/2')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '64'))
+REDIS_POOL_OPTIONS = {
+    'max_connections': REDIS_MAX_CONNECTIONS,
+    'timeout': 5,
+    'socket_keepalive': True,
+    'health_check_interval': 30
+}
 try:
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+    # One bounded pool per process, shared by every route; callers wait for
+    # a free connection instead of opening new sockets during vote bursts
+    _redis_pool = redis.BlockingConnectionPool.from_url(
+        REDIS_URL, decode_responses=True, **REDIS_POOL_OPTIONS
+    )
+    redis_client = redis.Redis(connection_pool=_redis_pool)
 except:
     redis_client = None
 
+# How long a voter's "already voted" marker is cached
+VOTE_CACHE_TTL = 3600
+
+# Atomically mark a voter (KEYS[1]) and bump the option's field (ARGV[2]) in
+# the poll's tally hash (KEYS[2]) in a single round trip; returns 0 without
+# side effects if already marked
+VOTE_LUA = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+    return 1
+end
+return 0
+"""
+vote_script = redis_client.register_script(VOTE_LUA) if redis_client else None
+
+# Optionally acknowledge authenticated votes from Redis and leave the database
+# write to an RQ worker (`rq worker votes`); the unique constraint makes
+# retried jobs idempotent
+ASYNC_VOTE_WRITES = os.getenv('ASYNC_VOTE_WRITES', 'false').lower() == 'true'
+vote_queue = None
+if ASYNC_VOTE_WRITES and Queue and redis_client:
+    # RQ pickles jobs, so it needs connections without decode_responses;
+    # they come from a pool bounded like the main one
+    vote_queue = Queue('votes', connection=redis.Redis(
+        connection_pool=redis.BlockingConnectionPool.from_url(REDIS_URL, **REDIS_POOL_OPTIONS)
+    ))
+VOTE_JOB_RETRY = [1, 5, 30]
+
+# Dialect-specific INSERTs that support ON CONFLICT DO NOTHING
+DIALECT_INSERTS = {
+    'postgresql': pg_insert,
+    'sqlite': sqlite_insert
+}
+
 # Initialize database
 init_db(app)
 
@@ -42,11 +104,24 @@ class Vote(db.Model):
     option_id = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, nullable=True)  # Null for anonymous votes
     username = db.Column(db.String(20), nullable=True)
-    voted_at = db.Column(db.DateTime, default=db.func.now())
+    # Set in Python so SQLite stores the same format keyset cursors bind
+    voted_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))  # For tracking (IPv4/IPv6)
     
     __table_args__ = (
-        db.Index('idx_poll_user', 'poll_id', 'user_id'),
+        # One vote per user per poll; anonymous votes (NULL user_id) are exempt
+        db.UniqueConstraint('poll_id', 'user_id', name='uq_vote_poll_user'),
+        db.Index('idx_poll_option', 'poll_id', 'option_id'),
+        db.Index('idx_voted_at', 'voted_at'),
+        # Matches get_user_votes' ORDER BY; on PostgreSQL it also covers
+        # poll_id/option_id so history and status reads are index-only
+        db.Index(
+            'idx_user_voted_at', user_id, voted_at.desc(), id.desc(),
+            postgresql_include=['poll_id', 'option_id']
+        ),
+        # The vote and results services both declare this table; keep
+        # whichever definition is imported first into a process
+        {'keep_existing': True}
     )
 
 
@@ -63,24 +138,95 @@ def check_poll_active(poll_id):
     return True
 
 
-def has_user_voted(poll_id, user_id):
-    """Check if user has already voted on this poll"""
-    # Check Redis cache first
-    if redis_client:
-        cache_key = f"vote:{poll_id}:{user_id}"
-        if redis_client.exists(cache_key):
-            return True
-    
-    # Check database
-    vote = Vote.query.filter_by(poll_id=poll_id, user_id=user_id).first()
+def tally_key_for(poll_id):
+    """Redis hash holding a poll's vote count per option_id"""
+    return f"poll_votes:{poll_id}"
+
+
+def claim_vote(voter_key, tally_key, option_id):
+    """Mark a voter as having voted and count the vote, unless already marked"""
+    return bool(vote_script(keys=[voter_key, tally_key], args=[VOTE_CACHE_TTL, option_id]))
+
+
+def release_vote(tally_key, option_id, voter_key=None):
+    """Undo a claimed vote that was not written to the database"""
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hincrby(tally_key, option_id, -1)
+        if voter_key:
+            pipe.delete(voter_key)
+        pipe.execute()
+
+
+def insert_vote_once(**values):
+    """Insert a vote unless the user already voted on the poll.
+
+    Relies on uq_vote_poll_user via ON CONFLICT DO NOTHING (INSERT OR IGNORE
+    semantics on SQLite) and returns the new vote's voted_at, or None if the
+    vote was a duplicate.
+    """
+    dialect_insert = DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
     
-    if vote:
-        # Cache the result
-        if redis_client:
-            redis_client.setex(f"vote:{poll_id}:{user_id}", 3600, "1")
-        return True
+    if dialect_insert is None:
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(
+                    insert(Vote).values(**values).returning(Vote.voted_at)
+                ).scalar_one()
+        except IntegrityError:
+            return None
     
-    return False
+    stmt = dialect_insert(Vote).values(**values).on_conflict_do_nothing(
+        index_elements=['poll_id', 'user_id']
+    ).returning(Vote.voted_at)
+    return db.session.execute(stmt).scalar_one_or_none()
+
+
+def insert_vote_row(poll_id, option_id, user_id, username, ip_address, voted_at):
+    """Background job: write a vote that cast_vote already acknowledged"""
+    with app.app_context():
+        try:
+            inserted = insert_vote_once(
+                poll_id=poll_id,
+                option_id=option_id,
+                user_id=user_id,
+                username=username,
+                ip_address=ip_address,
+                voted_at=voted_at
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        # A duplicate slipped past an expired marker; take back its tally
+        if inserted is None and redis_client:
+            release_vote(tally_key_for(poll_id), option_id)
+
+
+def vote_cast_response(poll_id, option_id, voted_at):
+    """Build the 201 response for a recorded vote"""
+    return ojsonify({
+        'message': 'Vote cast successfully',
+        'vote': {
+            'poll_id': poll_id,
+            'option_id': option_id,
+            'voted_at': voted_at.isoformat()
+        }
+    }, 201)
+
+
+def encode_cursor(voted_at, vote_id):
+    """Encode a keyset pagination position as an opaque token"""
+    return base64.urlsafe_b64encode(f"{voted_at.isoformat()}|{vote_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a pagination token into (voted_at, id); raises ValueError"""
+    try:
+        voted_at, vote_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    return datetime.fromisoformat(voted_at), int(vote_id)
 
 
 @app.route('/vote', methods=['POST'])
@@ -90,52 +236,75 @@ def cast_vote():
     data = request.get_json()
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return ojsonify({'error': 'No data provided'}, 400)
     
     poll_id = data.get('poll_id')
     option_id = data.get('option_id')
     
     if not poll_id or not option_id:
-        return jsonify({'error': 'poll_id and option_id are required'}), 400
+        return ojsonify({'error': 'poll_id and option_id are required'}, 400)
     
     # Check if poll is active
     # In production, verify with Poll service
     
-    # Check if user has already voted
-    if has_user_voted(poll_id, request.user_id):
-        return jsonify({'error': 'You have already voted on this poll'}), 409
-    
-    # Create vote
-    vote = Vote(
-        poll_id=poll_id,
-        option_id=option_id,
-        user_id=request.user_id,
-        username=request.username,
-        ip_address=request.remote_addr
-    )
+    voter_key = f"vote:{poll_id}:{request.user_id}"
+    tally_key = tally_key_for(poll_id)
+    
+    # Claim the vote in Redis first; a cached marker means a duplicate
+    if redis_client and not claim_vote(voter_key, tally_key, option_id):
+        return ojsonify({'error': 'You have already voted on this poll'}, 409)
+    
+    if vote_queue:
+        # The marker may have expired; confirm against the database before
+        # acknowledging, since the worker would drop a duplicate silently
+        if db.session.query(Vote.id).filter_by(
+            poll_id=poll_id, user_id=request.user_id
+        ).first():
+            release_vote(tally_key, option_id)
+            return ojsonify({'error': 'You have already voted on this poll'}, 409)
+        
+        voted_at = datetime.utcnow()
+        try:
+            vote_queue.enqueue(
+                insert_vote_row,
+                poll_id,
+                option_id,
+                request.user_id,
+                request.username,
+                request.remote_addr,
+                voted_at,
+                retry=Retry(max=len(VOTE_JOB_RETRY), interval=VOTE_JOB_RETRY)
+            )
+            return vote_cast_response(poll_id, option_id, voted_at)
+        except redis.RedisError as e:
+            # Fall back to writing the vote inline
+            app.logger.error(f"Failed to enqueue vote: {str(e)}")
     
     try:
-        db.session.add(vote)
-        db.session.commit()
+        # The marker may have expired, so the unique constraint stays authoritative
+        voted_at = insert_vote_once(
+            poll_id=poll_id,
+            option_id=option_id,
+            user_id=request.user_id,
+            username=request.username,
+            ip_address=request.remote_addr
+        )
         
-        # Cache the vote
-        if redis_client:
-            redis_client.setex(f"vote:{poll_id}:{request.user_id}", 3600, "1")
-            # Increment vote count in cache
-            redis_client.incr(f"poll_votes:{poll_id}:{option_id}")
+        if voted_at is None:
+            db.session.rollback()
+            if redis_client:
+                release_vote(tally_key, option_id)
+            return ojsonify({'error': 'You have already voted on this poll'}, 409)
         
-        return jsonify({
-            'message': 'Vote cast successfully',
-            'vote': {
-                'poll_id': vote.poll_id,
-                'option_id': vote.option_id,
-                'voted_at': vote.voted_at.isoformat()
-            }
-        }), 201
+        db.session.commit()
+        
+        return vote_cast_response(poll_id, option_id, voted_at)
     except Exception as e:
         db.session.rollback()
+        if redis_client:
+            release_vote(tally_key, option_id, voter_key)
         app.logger.error(f"Failed to cast vote: {str(e)}")
-        return jsonify({'error': 'Failed to cast vote'}), 500
+        return ojsonify({'error': 'Failed to cast vote'}, 500)
 
 
 @app.route('/vote/anonymous', methods=['POST'])
@@ -144,100 +313,107 @@ def cast_anonymous_vote():
     data = request.get_json()
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return ojsonify({'error': 'No data provided'}, 400)
     
     poll_id = data.get('poll_id')
     option_id = data.get('option_id')
     
     if not poll_id or not option_id:
-        return jsonify({'error': 'poll_id and option_id are required'}), 400
+        return ojsonify({'error': 'poll_id and option_id are required'}, 400)
     
     # For anonymous votes, use IP-based rate limiting
     ip_address = request.remote_addr
     
-    # Check if IP has voted recently (simple rate limiting)
-    if redis_client:
-        ip_vote_key = f"vote_ip:{poll_id}:{ip_address}"
-        if redis_client.exists(ip_vote_key):
-            return jsonify({'error': 'You have already voted on this poll'}), 429
-    
-    # Create anonymous vote
-    vote = Vote(
-        poll_id=poll_id,
-        option_id=option_id,
-        user_id=None,
-        username=None,
-        ip_address=ip_address
-    )
+    ip_vote_key = f"vote_ip:{poll_id}:{ip_address}"
+    tally_key = tally_key_for(poll_id)
+    
+    # Claim the vote for this IP (expires in 1 hour)
+    if redis_client and not claim_vote(ip_vote_key, tally_key, option_id):
+        return ojsonify({'error': 'You have already voted on this poll'}, 429)
     
     try:
-        db.session.add(vote)
+        # Create anonymous vote with a Core INSERT; no ORM unit of work needed
+        voted_at = db.session.execute(
+            insert(Vote).values(
+                poll_id=poll_id,
+                option_id=option_id,
+                user_id=None,
+                username=None,
+                ip_address=ip_address
+            ).returning(Vote.voted_at)
+        ).scalar_one()
         db.session.commit()
         
-        # Cache IP vote (expires in 1 hour)
-        if redis_client:
-            redis_client.setex(ip_vote_key, 3600, "1")
-            redis_client.incr(f"poll_votes:{poll_id}:{option_id}")
-        
-        return jsonify({
+        return ojsonify({
             'message': 'Anonymous vote cast successfully',
             'vote': {
-                'poll_id': vote.poll_id,
-                'option_id': vote.option_id,
-                'voted_at': vote.voted_at.isoformat()
+                'poll_id': poll_id,
+                'option_id': option_id,
+                'voted_at': voted_at.isoformat()
             }
-        }), 201
+        }, 201)
     except Exception as e:
         db.session.rollback()
+        if redis_client:
+            release_vote(tally_key, option_id, ip_vote_key)
         app.logger.error(f"Failed to cast anonymous vote: {str(e)}")
-        return jsonify({'error': 'Failed to cast vote'}), 500
+        return ojsonify({'error': 'Failed to cast vote'}, 500)
 
 
 @app.route('/vote/check/<int:poll_id>', methods=['GET'])
 @token_required
 def check_vote_status(poll_id):
     """Check if user has voted on a specific poll"""
-    has_voted = has_user_voted(poll_id, request.user_id)
-    
-    vote = None
-    if has_voted:
-        vote = Vote.query.filter_by(poll_id=poll_id, user_id=request.user_id).first()
+    vote = db.session.query(Vote.option_id, Vote.voted_at).filter_by(
+        poll_id=poll_id, user_id=request.user_id
+    ).first()
     
-    return jsonify({
-        'has_voted': has_voted,
+    return ojsonify({
+        'has_voted': vote is not None,
         'vote': {
             'option_id': vote.option_id,
             'voted_at': vote.voted_at.isoformat()
         } if vote else None
-    }), 200
+    }, 200)
 
 
 @app.route('/vote/user', methods=['GET'])
 @token_required
 def get_user_votes():
     """Get all votes cast by the authenticated user"""
-    page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
     
-    per_page = min(per_page, 50)
+    per_page = min(max(per_page, 1), 50)
     
-    votes = Vote.query.filter_by(user_id=request.user_id).order_by(Vote.voted_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    # Keyset pagination on (voted_at, id) avoids OFFSET scans and COUNT(*)
+    query = db.session.query(Vote.id, Vote.poll_id, Vote.option_id, Vote.voted_at).filter(
+        Vote.user_id == request.user_id
     )
     
-    return jsonify({
+    if cursor:
+        try:
+            query = query.filter(db.tuple_(Vote.voted_at, Vote.id) < decode_cursor(cursor))
+        except ValueError:
+            return ojsonify({'error': 'Invalid cursor'}, 400)
+    
+    votes = query.order_by(Vote.voted_at.desc(), Vote.id.desc()).limit(per_page + 1).all()
+    
+    has_more = len(votes) > per_page
+    votes = votes[:per_page]
+    
+    return ojsonify({
         'votes': [{
             'poll_id': vote.poll_id,
             'option_id': vote.option_id,
             'voted_at': vote.voted_at.isoformat()
-        } for vote in votes.items],
-        'total': votes.total,
-        'page': votes.page,
-        'pages': votes.pages
-    }), 200
+        } for vote in votes],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(votes[-1].voted_at, votes[-1].id) if has_more else None
+    }, 200)
 
 
 if __name__ == '__main__':
-    import os
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    # Development server only. In production run:
+    #   gunicorn -c ../../shared/gunicorn_conf.py app:app
+    app.run(host='0.0.0.0', port=5000, debug=False)
@@ -3,7 +3,10 @@ Shared utilities for JWT token handling across microservices
 """
 import jwt
 import os
-from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
 from functools import wraps
 from flask import request, jsonify
 
@@ -11,27 +14,63 @@ JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-producti
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Key bytes and decoder are built once rather than on every call
+_jwt_key = JWT_SECRET_KEY.encode('utf-8')
+_jwt = jwt.PyJWT()
+
+# Only exp is relied upon; skip validation of claims the services never set
+_JWT_DECODE_OPTIONS = {
+    'require': ['exp'],
+    'verify_aud': False,
+    'verify_iss': False,
+    'verify_iat': False
+}
+
+# Decoded payloads of recently seen tokens, keyed by a digest of the token,
+# so repeat requests skip signature verification and claim parsing
+_token_cache = TTLCache(maxsize=10000, ttl=300)
+_token_cache_lock = threading.Lock()
+
 
 def generate_token(user_id, username):
     """Generate JWT token for authenticated user"""
+    # Integer epoch seconds are already NumericDates; no datetime conversion
+    now = int(time.time())
     payload = {
         'user_id': user_id,
         'username': username,
-        'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS),
-        'iat': datetime.utcnow()
+        'exp': now + JWT_EXPIRATION_HOURS * 3600,
+        'iat': now
     }
-    return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    return _jwt.encode(payload, _jwt_key, algorithm=JWT_ALGORITHM)
 
 
 def decode_token(token):
     """Decode and validate JWT token"""
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
+    with _token_cache_lock:
+        payload = _token_cache.get(cache_key)
+    
+    if payload is not None:
+        # Cached entries can outlive the token itself
+        if payload['exp'] > time.time():
+            return payload
+        return None
+    
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
+        payload = _jwt.decode(
+            token, _jwt_key, algorithms=[JWT_ALGORITHM], options=_JWT_DECODE_OPTIONS
+        )
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    
+    with _token_cache_lock:
+        _token_cache[cache_key] = payload
+    
+    return payload
 
 
 def token_required(f):
@@ -51,7 +90,7 @@ def token_required(f):
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
         
-        # Decode token
+        # Decode token; repeat tokens from polling clients hit decode_token's cache
         payload = decode_token(token)
         if not payload:
             return jsonify({'error': 'Token is invalid or expired'}), 401
@@ -1,14 +1,44 @@
 """
 Shared database models and utilities
 """
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Connection pool settings for server databases (PostgreSQL)
+ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_pre_ping': True
+}
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so SQLite readers don't block on writers"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
 
 def init_db(app):
     """Initialize database with Flask app"""
+    if not app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', ENGINE_OPTIONS)
     db.init_app(app)
     with app.app_context():
         db.create_all()
@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration shared by the microservices
+
+Run from a service directory with: gunicorn -c ../../shared/gunicorn_conf.py app:app
+
+The gevent worker monkey-patches the standard library before the app is
+imported, so blocking Redis and HTTP socket I/O yields to other greenlets.
+psycopg2 is a C extension the patching cannot reach, so each worker also
+installs psycogreen's wait callback to make PostgreSQL queries cooperative.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 30
+
+
+def post_worker_init(worker):
+    """Let psycopg2 yield to other greenlets while waiting on the database"""
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
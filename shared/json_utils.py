@@ -0,0 +1,15 @@
+"""
+Shared JSON response helpers backed by orjson
+"""
+import orjson
+from flask import Response
+
+
+class ORJSONResponse(Response):
+    """Response class for bodies that are already serialized JSON"""
+    default_mimetype = 'application/json'
+
+
+def ojsonify(obj, status=200):
+    """Serialize obj with orjson and wrap it in a JSON response"""
+    return ORJSONResponse(orjson.dumps(obj), status=status)
@@ -3,11 +3,12 @@ Shared validation utilities
 """
 import re
 
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 
 def validate_username(username):
@@ -21,17 +22,26 @@ def validate_password(password):
     """Validate password strength (min 8 characters, at least one number)"""
     if len(password) < 8:
         return False
-    if not any(char.isdigit() for char in password):
-        return False
-    if not any(char.isalpha() for char in password):
-        return False
-    return True
+    
+    # Single pass: bit 1 = seen a digit, bit 2 = seen a letter
+    seen = 0
+    for char in password:
+        if char.isdigit():
+            seen |= 1
+        elif char.isalpha():
+            seen |= 2
+        if seen == 3:
+            return True
+    return False
 
 
 def sanitize_input(text, max_length=500):
     """Sanitize text input"""
     if not text:
         return text
+    # Already clean: no surrounding whitespace and within the limit
+    if len(text) <= max_length and not (text[0].isspace() or text[-1].isspace()):
+        return text
     # Remove potential XSS characters
     text = text.strip()
     if len(text) > max_length:
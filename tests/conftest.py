@@ -0,0 +1,88 @@
+"""
+Shared pytest fixtures
+"""
+import os
+import sys
+
+import fakeredis
+import pytest
+import redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+# Must be set before any service module is imported, since each service
+# configures its database engine at import time
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.database import db
+
+
+# pysqlite defers BEGIN and mishandles SAVEPOINT; let SQLAlchemy emit BEGIN
+# itself so the per-test SAVEPOINT rollback below works
+@event.listens_for(Engine, 'connect')
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(Engine, 'begin')
+def _emit_begin(connection):
+    connection.exec_driver_sql('BEGIN')
+
+
+@pytest.fixture(scope='module')
+def app(request):
+    """Create the database schema once for the module's service_app"""
+    service_app = request.module.service_app
+    service_app.config['TESTING'] = True
+    
+    with service_app.app_context():
+        db.create_all()
+        yield service_app
+        db.drop_all()
+
+
+@pytest.fixture(autouse=True)
+def redis_client(request, monkeypatch):
+    """Back the module's service Redis client, and its scripts, with an in-memory server"""
+    service_app = getattr(request.module, 'service_app', None)
+    service = sys.modules[service_app.import_name] if service_app else None
+    if not hasattr(service, 'redis_client'):
+        return None
+    
+    decode_responses = bool(
+        service.redis_client and service.redis_client.get_connection_kwargs().get('decode_responses')
+    )
+    client = fakeredis.FakeRedis(decode_responses=decode_responses)
+    monkeypatch.setattr(service, 'redis_client', client)
+    
+    for name, value in vars(service).copy().items():
+        if isinstance(value, redis.commands.core.Script):
+            monkeypatch.setattr(service, name, client.register_script(value.script))
+    
+    return client
+
+
+@pytest.fixture
+def client(app):
+    """Create test client whose database changes are rolled back after each test"""
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    
+    # Route the app's session through the outer transaction; commits inside
+    # the app only release a SAVEPOINT
+    original_session = db.session
+    db.session = scoped_session(
+        sessionmaker(bind=connection, join_transaction_mode='create_savepoint')
+    )
+    
+    try:
+        with app.test_client() as client:
+            yield client
+    finally:
+        db.session.remove()
+        db.session = original_session
+        transaction.rollback()
+        connection.close()
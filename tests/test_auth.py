@@ -8,21 +8,11 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from services.auth.app import app, db, User
+# Minimum bcrypt cost keeps password hashing from dominating test time;
+# must be set before the auth service module is imported
+os.environ['BCRYPT_ROUNDS'] = '4'
 
-
-@pytest.fixture
-def client():
-    """Create test client"""
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-        yield client
-        with app.app_context():
-            db.drop_all()
+from services.auth.app import app as service_app, db, User
 
 
 def test_health_check(client):
@@ -67,6 +57,26 @@ def test_register_duplicate_username(client):
     assert b'Username already exists' in response.data
 
 
+def test_register_duplicate_email(client):
+    """Test registration with duplicate email"""
+    # Register first user
+    client.post('/register', json={
+        'username': 'testuser1',
+        'email': 'test@example.com',
+        'password': 'Test1234'
+    })
+    
+    # Try to register with same email
+    response = client.post('/register', json={
+        'username': 'testuser2',
+        'email': 'test@example.com',
+        'password': 'Test1234'
+    })
+    
+    assert response.status_code == 409
+    assert b'Email already registered' in response.data
+
+
 def test_register_invalid_email(client):
     """Test registration with invalid email"""
     response = client.post('/register', json={
@@ -141,3 +151,17 @@ def test_verify_token(client):
     data = response.get_json()
     assert data['valid'] is True
     assert data['username'] == 'testuser'
+
+
+def test_repeat_token_skips_verification(monkeypatch):
+    """Test that a token seen before is not decoded again"""
+    from shared import auth_utils
+    
+    token = auth_utils.generate_token(42, 'poller')
+    assert auth_utils.decode_token(token)['user_id'] == 42
+    
+    def fail(*args, **kwargs):
+        raise AssertionError('token was decoded again')
+    
+    monkeypatch.setattr(auth_utils._jwt, 'decode', fail)
+    assert auth_utils.decode_token(token)['username'] == 'poller'
@@ -0,0 +1,66 @@
+"""
+Unit tests for the API Gateway rate limiter
+"""
+import pytest
+import redis
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gateway.app as gateway
+from gateway.app import app as service_app
+
+
+@pytest.fixture
+def token_bucket_script(redis_client, monkeypatch):
+    """Run the Redis token bucket script against the in-memory server"""
+    script = redis_client.register_script(gateway.TOKEN_BUCKET_LUA)
+    monkeypatch.setattr(gateway, 'token_bucket_script', script)
+    monkeypatch.setattr(gateway, '_redis_retry_at', 0.0)
+    return script
+
+
+def test_in_process_token_bucket():
+    """Test that the in-process bucket allows a burst, then asks to wait"""
+    key = ('10.0.0.1', 'test_in_process_token_bucket')
+    
+    assert gateway._take_token(key, 2, 60) == 0
+    assert gateway._take_token(key, 2, 60) == 0
+    assert gateway._take_token(key, 2, 60) == 30
+    assert gateway._take_token(('10.0.0.2', 'test_in_process_token_bucket'), 2, 60) == 0
+
+
+def test_token_bucket_script(token_bucket_script):
+    """Test the Lua bucket's allowed flag and retry_after directly"""
+    keys, args = ['rl:10.0.0.1:vote'], [2, 60000]
+    
+    assert token_bucket_script(keys=keys, args=args) == [1, 0]
+    assert token_bucket_script(keys=keys, args=args) == [1, 0]
+    assert token_bucket_script(keys=keys, args=args) == [0, 30]
+
+
+def test_redis_token_bucket(token_bucket_script, redis_client):
+    """Test that the limiter uses the shared Redis bucket"""
+    assert gateway._take_token_redis('10.0.0.1', 'results', 2, 60) == 0
+    assert gateway._take_token_redis('10.0.0.1', 'results', 2, 60) == 0
+    assert 1 <= gateway._take_token_redis('10.0.0.1', 'results', 2, 60) <= 30
+    assert gateway._take_token_redis('10.0.0.2', 'results', 2, 60) == 0
+    assert 0 < redis_client.pttl('rl:10.0.0.1:results') <= 60000
+
+
+def test_redis_outage_uses_cooldown(monkeypatch):
+    """Test that a Redis error falls back and skips Redis during the cooldown"""
+    calls = []
+    
+    def unavailable(keys, args):
+        calls.append(keys)
+        raise redis.ConnectionError('Redis is down')
+    
+    monkeypatch.setattr(gateway, 'token_bucket_script', unavailable)
+    monkeypatch.setattr(gateway, '_redis_retry_at', 0.0)
+    
+    assert gateway._take_token_redis('10.0.0.3', 'results', 2, 60) == 0
+    assert gateway._take_token_redis('10.0.0.3', 'results', 2, 60) == 0
+    assert gateway._take_token_redis('10.0.0.3', 'results', 2, 60) == 30
+    assert len(calls) == 1
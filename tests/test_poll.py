@@ -7,24 +7,10 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from services.poll.app import app, db, Poll, PollOption
+from services.poll.app import app as service_app, db, Poll, PollOption
 from shared.auth_utils import generate_token
 
 
-@pytest.fixture
-def client():
-    """Create test client"""
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-        yield client
-        with app.app_context():
-            db.drop_all()
-
-
 @pytest.fixture
 def auth_token():
     """Generate test authentication token"""
@@ -68,6 +54,20 @@ def test_create_poll_insufficient_options(client, auth_token):
     assert b'At least 2 options are required' in response.data
 
 
+def test_create_poll_blank_options(client, auth_token):
+    """Test poll creation where blank options leave too few choices"""
+    response = client.post('/polls',
+        headers={'Authorization': f'Bearer {auth_token}'},
+        json={
+            'title': 'Test Poll',
+            'options': ['Option 1', '   ']
+        }
+    )
+    
+    assert response.status_code == 400
+    assert b'At least 2 options are required' in response.data
+
+
 def test_get_polls(client, auth_token):
     """Test getting all polls"""
     # Create a poll first
@@ -105,3 +105,41 @@ def test_get_poll_by_id(client, auth_token):
     assert response.status_code == 200
     data = response.get_json()
     assert data['title'] == 'Test Poll'
+
+
+def test_get_polls_cached(client, auth_token):
+    """Test that a repeated poll listing is served from cache"""
+    client.post('/polls',
+        headers={'Authorization': f'Bearer {auth_token}'},
+        json={
+            'title': 'Test Poll',
+            'options': ['Option 1', 'Option 2']
+        }
+    )
+    client.get('/polls')
+    
+    # Written directly, so the cached listing is not invalidated
+    db.session.add(Poll(title='Uncached Poll', creator_id=1, creator_username='testuser'))
+    db.session.commit()
+    
+    response = client.get('/polls')
+    assert response.status_code == 200
+    assert [poll['title'] for poll in response.get_json()['polls']] == ['Test Poll']
+
+
+def test_poll_changes_invalidate_list_cache(client, auth_token, redis_client):
+    """Test that create, close and delete bump the listing cache version"""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    
+    create_response = client.post('/polls', headers=headers, json={
+        'title': 'Test Poll',
+        'options': ['Option 1', 'Option 2']
+    })
+    poll_id = create_response.get_json()['poll']['id']
+    assert redis_client.get('polls:list:version') == '1'
+    
+    client.post(f'/polls/{poll_id}/close', headers=headers)
+    assert redis_client.get('polls:list:version') == '2'
+    
+    client.delete(f'/polls/{poll_id}', headers=headers)
+    assert redis_client.get('polls:list:version') == '3'
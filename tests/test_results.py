@@ -0,0 +1,131 @@
+"""
+Unit tests for Results Service
+"""
+import fakeredis
+import orjson
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import services.results.app as results_service
+from services.results.app import app as service_app, db, Vote
+from shared.auth_utils import generate_token
+
+
+class ImmediatePool:
+    """Run background refreshes inline so tests can observe them"""
+    
+    def __init__(self):
+        self.submitted = []
+    
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        fn(*args)
+
+
+@pytest.fixture
+def refresh_pool(monkeypatch):
+    """Replace the background refresh pool with an inline one"""
+    pool = ImmediatePool()
+    monkeypatch.setattr(results_service, '_refresh_pool', pool)
+    return pool
+
+
+def add_votes(poll_id, option_ids):
+    """Insert one vote per option id for a poll"""
+    for option_id in option_ids:
+        db.session.add(Vote(poll_id=poll_id, option_id=option_id))
+    db.session.commit()
+
+
+def test_health_check(client):
+    """Test health check endpoint"""
+    response = client.get('/health')
+    assert response.status_code == 200
+
+
+def test_poll_results(client, redis_client):
+    """Test vote counts and percentages, and that they are cached"""
+    add_votes(1, [2, 1, 2])
+    
+    response = client.get('/results/1')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['total_votes'] == 3
+    assert data['results'] == [
+        {'option_id': 2, 'votes': 2, 'percentage': 66.67},
+        {'option_id': 1, 'votes': 1, 'percentage': 33.33}
+    ]
+    assert orjson.loads(redis_client.get('results:1')) == data
+    assert redis_client.ttl('results:1') > results_service.RESULTS_FRESH_SECONDS
+
+
+def test_poll_results_no_votes(client):
+    """Test results for a poll nobody has voted on"""
+    response = client.get('/results/1')
+    
+    assert response.status_code == 200
+    assert response.get_json() == {'poll_id': 1, 'total_votes': 0, 'results': []}
+
+
+def test_fresh_results_served_from_cache(client, redis_client, refresh_pool):
+    """Test that fresh cached results are returned without a refresh"""
+    redis_client.setex('results:1', results_service.RESULTS_CACHE_TTL, b'{"cached":true}')
+    
+    response = client.get('/results/1')
+    
+    assert response.get_json() == {'cached': True}
+    assert refresh_pool.submitted == []
+
+
+def test_stale_results_refreshed_in_background(client, redis_client, refresh_pool):
+    """Test that stale results are served while being recomputed"""
+    add_votes(1, [1])
+    redis_client.setex('results:1', 20, b'{"cached":true}')
+    
+    response = client.get('/results/1')
+    
+    assert response.get_json() == {'cached': True}
+    assert refresh_pool.submitted == [(1,)]
+    assert orjson.loads(redis_client.get('results:1'))['total_votes'] == 1
+    assert redis_client.ttl('results:1') > results_service.RESULTS_FRESH_SECONDS
+
+
+def test_stale_results_refreshed_once(client, redis_client, refresh_pool):
+    """Test that only the request holding the refresh lock recomputes"""
+    redis_client.setex('results:1', 20, b'{"cached":true}')
+    redis_client.set('results:1:refresh', 1)
+    
+    response = client.get('/results/1')
+    
+    assert response.get_json() == {'cached': True}
+    assert refresh_pool.submitted == []
+
+
+def test_poll_results_without_redis(client, monkeypatch):
+    """Test that results come from the database when Redis is down"""
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(results_service, 'redis_client', fakeredis.FakeRedis(server=server))
+    add_votes(1, [1])
+    
+    response = client.get('/results/1')
+    
+    assert response.status_code == 200
+    assert response.get_json()['total_votes'] == 1
+
+
+def test_detailed_results_shape(client):
+    """Test that detailed results have the same shape with and without votes"""
+    headers = {'Authorization': f'Bearer {generate_token(1, "creator")}'}
+    
+    empty = client.get('/results/1/detailed?per_page=5', headers=headers).get_json()
+    assert empty == {'poll_id': 1, 'total_votes': 0, 'results': [], 'page': 1, 'per_page': 5}
+    
+    add_votes(1, [1])
+    data = client.get('/results/1/detailed?per_page=5', headers=headers).get_json()
+    assert data.keys() == empty.keys()
+    assert [voter['username'] for voter in data['results'][0]['voters']] == ['Anonymous']
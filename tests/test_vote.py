@@ -0,0 +1,101 @@
+"""
+Unit tests for Vote Service
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import services.vote.app as vote_service
+from services.vote.app import app as service_app, db, Vote
+from shared.auth_utils import generate_token
+
+
+@pytest.fixture
+def auth_token():
+    """Generate test authentication token"""
+    return generate_token(1, 'testuser')
+
+
+def test_health_check(client):
+    """Test health check endpoint"""
+    response = client.get('/health')
+    assert response.status_code == 200
+
+
+def test_cast_vote(client, auth_token, redis_client):
+    """Test casting a vote"""
+    response = client.post('/vote',
+        headers={'Authorization': f'Bearer {auth_token}'},
+        json={'poll_id': 1, 'option_id': 2}
+    )
+    
+    assert response.status_code == 201
+    assert response.get_json()['vote']['option_id'] == 2
+    assert redis_client.hgetall('poll_votes:1') == {'2': '1'}
+
+
+def test_cast_vote_duplicate(client, auth_token, redis_client):
+    """Test that a second vote on the same poll is rejected"""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    client.post('/vote', headers=headers, json={'poll_id': 1, 'option_id': 2})
+    
+    response = client.post('/vote', headers=headers, json={'poll_id': 1, 'option_id': 3})
+    
+    assert response.status_code == 409
+    assert redis_client.hgetall('poll_votes:1') == {'2': '1'}
+
+
+def test_cast_vote_duplicate_after_marker_expires(client, auth_token, redis_client):
+    """Test that the database rejects a duplicate once the Redis marker is gone"""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    client.post('/vote', headers=headers, json={'poll_id': 1, 'option_id': 2})
+    redis_client.delete('vote:1:1')
+    
+    response = client.post('/vote', headers=headers, json={'poll_id': 1, 'option_id': 3})
+    
+    assert response.status_code == 409
+    assert redis_client.hgetall('poll_votes:1') == {'2': '1', '3': '0'}
+    assert db.session.query(Vote).filter_by(poll_id=1, user_id=1).count() == 1
+
+
+def test_cast_vote_failure_releases_claim(client, auth_token, redis_client, monkeypatch):
+    """Test that a failed database write undoes the Redis claim"""
+    def fail(**values):
+        raise RuntimeError('database unavailable')
+    
+    monkeypatch.setattr(vote_service, 'insert_vote_once', fail)
+    
+    response = client.post('/vote',
+        headers={'Authorization': f'Bearer {auth_token}'},
+        json={'poll_id': 1, 'option_id': 2}
+    )
+    
+    assert response.status_code == 500
+    assert not redis_client.exists('vote:1:1')
+    assert redis_client.hgetall('poll_votes:1') == {'2': '0'}
+
+
+def test_user_votes_pagination(client, auth_token):
+    """Test walking every page of a user's vote history"""
+    for poll_id in range(1, 6):
+        db.session.add(Vote(poll_id=poll_id, option_id=1, user_id=1, username='testuser'))
+    db.session.commit()
+    
+    seen = []
+    cursor = None
+    for _ in range(5):
+        url = '/vote/user?per_page=2' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers={'Authorization': f'Bearer {auth_token}'})
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(vote['poll_id'] for vote in data['votes'])
+        
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    
+    assert not data['has_more']
+    assert seen == [5, 4, 3, 2, 1]